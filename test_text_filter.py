@@ -0,0 +1,32 @@
+import pytest
+
+from text_filter import should_translate
+
+
+@pytest.mark.parametrize('text', [
+    'Was will er?',
+    'Ich will was essen',
+    'Is het goed zo?',
+    'Ik ben thuis, is dat oke?',
+    'My jsme doma',
+    'Det er for sent, har du tid?',
+    'Hola amigo, como estas?',
+    'Ca va bien, merci',
+    'Привет',
+])
+def test_non_english_is_translated(text):
+    assert should_translate(text)
+
+
+@pytest.mark.parametrize('text', [
+    'What are you doing with that?',
+    'The cat and the dog',
+    'How would they know',
+])
+def test_plain_english_is_skipped(text):
+    assert not should_translate(text)
+
+
+@pytest.mark.parametrize('text', ['+1', '10:30', ':-)', '  x  ', '!! '])
+def test_text_without_letters_or_too_short_is_skipped(text):
+    assert not should_translate(text)
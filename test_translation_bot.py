@@ -0,0 +1,334 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+import pytest
+
+import translation_bot
+from translation_bot import BATCH_SEPARATOR, TranslationBatcher, TranslationError
+
+
+# Stands in for fetch_translation: tags each separated segment as translated and
+# reports the same source language for the whole request
+class FakeGoogle:
+    def __init__(self, source='xx', separator=BATCH_SEPARATOR, fail=None):
+        self.source = source
+        self.separator = separator
+        self.fail = fail
+        self.calls = []
+
+    async def __call__(self, text):
+        self.calls.append(text)
+        if self.fail is not None:
+            self.fail(text)
+        parts = text.split(BATCH_SEPARATOR)
+        return self.source, self.separator.join('EN ' + part for part in parts)
+
+
+def http_error(status):
+    request = httpx.Request('GET', translation_bot.TRANSLATE_URL)
+    return httpx.HTTPStatusError(str(status), request=request, response=httpx.Response(status, request=request))
+
+
+def run_batch(items, **kwargs):
+    batcher = TranslationBatcher(window=0, **kwargs)
+
+    async def submit_all():
+        futures = [batcher.submit(text, hint) for text, hint in items]
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    return asyncio.run(submit_all())
+
+
+@pytest.fixture
+def google(monkeypatch):
+    fake = FakeGoogle()
+    monkeypatch.setattr(translation_bot, 'fetch_translation', fake)
+    return fake
+
+
+def test_same_language_texts_share_one_request(google):
+    results = run_batch([('hola', 'es'), ('adios', 'es'), ('gracias', 'es')])
+    assert len(google.calls) == 1
+    assert results == [('es', 'EN hola'), ('es', 'EN adios'), ('es', 'EN gracias')]
+
+
+def test_languages_and_unsure_texts_are_sent_apart(google):
+    results = run_batch([('hola', 'es'), ('danke', 'de'), ('adios', 'es'), ('ciao', None)])
+    assert sorted(google.calls) == sorted(['hola' + BATCH_SEPARATOR + 'adios', 'danke', 'ciao'])
+    assert results[1] == ('xx', 'EN danke')
+    assert results[3] == ('xx', 'EN ciao')
+
+
+def test_separator_split_ignores_case(google):
+    google.separator = '\n@@Split@@\n'
+    results = run_batch([('hola', 'es'), ('adios', 'es')])
+    assert len(google.calls) == 1
+    assert results == [('es', 'EN hola'), ('es', 'EN adios')]
+
+
+def test_bad_split_falls_back_to_each_text(google):
+    google.separator = ' '
+    results = run_batch([('hola', 'es'), ('adios', 'es')])
+    assert google.calls[1:] == ['hola', 'adios']
+    assert results == [('xx', 'EN hola'), ('xx', 'EN adios')]
+
+
+def test_http_error_falls_back_and_keeps_failures_apart(google):
+    def fail(text):
+        if BATCH_SEPARATOR in text:
+            raise http_error(414)
+        if text == 'adios':
+            raise TranslationError('bad response')
+
+    google.fail = fail
+    results = run_batch([('hola', 'es'), ('adios', 'es'), ('gracias', 'es')])
+    assert len(google.calls) == 4
+    assert results[0] == ('xx', 'EN hola')
+    assert isinstance(results[1], TranslationError)
+    assert results[2] == ('xx', 'EN gracias')
+
+
+def test_batch_size_is_measured_percent_encoded(google):
+    run_batch([('a' * 495, 'es')] * 3)
+    assert len(google.calls) == 1
+
+    google.calls.clear()
+    run_batch([('क' * 495, 'hi')] * 3)
+    assert len(google.calls) == 3
+
+
+def test_concurrent_identical_texts_share_one_translation(google, monkeypatch):
+    monkeypatch.setattr(translation_bot, '_translation_cache', OrderedDict())
+
+    async def translate_twice():
+        return await asyncio.gather(
+            translation_bot.translate_cached('hola', 'hola', 'es'),
+            translation_bot.translate_cached('hola', 'hola', 'es')
+        )
+
+    assert asyncio.run(translate_twice()) == [('xx', 'EN hola'), ('xx', 'EN hola')]
+    assert google.calls == ['hola']
+
+
+def test_translation_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(translation_bot, '_translation_cache', OrderedDict())
+    monkeypatch.setattr(translation_bot, 'TRANSLATION_CACHE_SIZE', 2)
+    translation_bot.cache_translation('a', ('es', 'A'))
+    translation_bot.cache_translation('b', ('es', 'B'))
+    assert translation_bot.get_cached_translation('a') == ('es', 'A')
+    translation_bot.cache_translation('c', ('es', 'C'))
+    assert translation_bot.get_cached_translation('b') is None
+    assert translation_bot.get_cached_translation('a') == ('es', 'A')
+
+
+def test_translation_cache_expires(monkeypatch):
+    monkeypatch.setattr(translation_bot, '_translation_cache', OrderedDict())
+    monkeypatch.setattr(translation_bot, 'TRANSLATION_CACHE_TTL', 0)
+    translation_bot.cache_translation('a', ('es', 'A'))
+    assert translation_bot.get_cached_translation('a') is None
+    assert 'a' not in translation_bot._translation_cache
+
+
+class FakeMember:
+    def __init__(self, status):
+        self.status = status
+
+
+class FakeAdminBot:
+    def __init__(self):
+        self.lookups = []
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.lookups.append((chat_id, user_id))
+        return FakeMember('administrator' if user_id == 1 else 'member')
+
+
+def test_admin_cache_is_lru(monkeypatch):
+    monkeypatch.setattr(translation_bot, 'admin_cache', OrderedDict())
+    monkeypatch.setattr(translation_bot, 'ADMIN_CACHE_SIZE', 2)
+    bot = FakeAdminBot()
+
+    async def check(*user_ids):
+        return [await translation_bot.is_admin(bot, -1, user_id) for user_id in user_ids]
+
+    assert asyncio.run(check(1, 2, 1, 3, 1)) == [True, False, True, False, True]
+    assert bot.lookups == [(-1, 1), (-1, 2), (-1, 3)]
+
+
+def test_admin_cache_expires(monkeypatch):
+    monkeypatch.setattr(translation_bot, 'admin_cache', OrderedDict())
+    monkeypatch.setattr(translation_bot, 'ADMIN_CACHE_TTL', 0)
+    bot = FakeAdminBot()
+
+    async def check_twice():
+        await translation_bot.is_admin(bot, -1, 1)
+        await translation_bot.is_admin(bot, -1, 1)
+
+    asyncio.run(check_twice())
+    assert len(bot.lookups) == 2
+
+
+def test_rate_limiter_waits_for_a_free_slot():
+    limiter = translation_bot.RateLimiter(rate=2, per=0.2)
+
+    async def acquire_three():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(3):
+            await limiter.acquire(-1)
+        return loop.time() - start
+
+    assert asyncio.run(acquire_three()) >= 0.19
+
+
+def test_rate_limiter_forgets_idle_chats():
+    limiter = translation_bot.RateLimiter(rate=1, per=0.05)
+
+    async def acquire_apart():
+        await limiter.acquire(-1)
+        await asyncio.sleep(0.06)
+        await limiter.acquire(-2)
+
+    asyncio.run(acquire_apart())
+    assert list(limiter.sent) == [-2]
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text, kwargs.get('reply_to_message_id')))
+
+
+class FakeApplication:
+    def create_task(self, coroutine):
+        return asyncio.ensure_future(coroutine)
+
+
+class FakeContext:
+    def __init__(self):
+        self.bot = FakeBot()
+        self.application = FakeApplication()
+
+
+def test_single_reply_replies_to_its_message():
+    context = FakeContext()
+    batcher = translation_bot.ReplyBatcher(window=0.01)
+
+    async def reply():
+        batcher.add(context, -1, 7, 'Juan', '🌐 Spanish: Hello')
+        await asyncio.sleep(0.05)
+
+    asyncio.run(reply())
+    assert context.bot.sent == [(-1, '🌐 Spanish: Hello', 7)]
+
+
+def test_replies_coalesce_while_rate_limited():
+    context = FakeContext()
+    batcher = translation_bot.ReplyBatcher(window=0.01)
+    batcher.limiter = translation_bot.RateLimiter(rate=1, per=0.3)
+
+    async def flood():
+        for message_id in range(1, 5):
+            batcher.add(context, -1, message_id, 'Ana', f'🌐 Spanish: line {message_id}')
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.4)
+
+    asyncio.run(flood())
+    assert context.bot.sent == [
+        (-1, '🌐 Spanish: line 1', 1),
+        (-1, '\n\n'.join(f'👤 Ana\n🌐 Spanish: line {n}' for n in (2, 3, 4)), 2),
+    ]
+    assert not batcher.pending
+
+
+def test_batched_replies_are_chunked_under_the_limit():
+    context = FakeContext()
+    batcher = translation_bot.ReplyBatcher(window=0.01, limit=60)
+
+    async def reply():
+        batcher.add(context, -1, 5, 'Juan', '🌐 Spanish: Hello friend')
+        batcher.add(context, -1, 6, 'Ana', '🌐 German: What does he want?')
+        batcher.add(context, -1, 7, 'Olek', '🌐 Polish: Us')
+        await asyncio.sleep(0.05)
+
+    asyncio.run(reply())
+    assert context.bot.sent == [
+        (-1, '👤 Juan\n🌐 Spanish: Hello friend', 5),
+        (-1, '👤 Ana\n🌐 German: What does he want?\n\n👤 Olek\n🌐 Polish: Us', 6),
+    ]
+
+
+@pytest.fixture
+def settings_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(translation_bot, 'SETTINGS_FLUSH_INTERVAL', 0.01)
+    return str(tmp_path / 'settings.db')
+
+
+def test_group_settings_survive_a_restart(settings_path):
+    manager = translation_bot.GroupManager(settings_path)
+
+    async def toggle_and_close():
+        manager.start()
+        manager.toggle(-1)
+        manager.toggle(-2)
+        manager.toggle(-2)
+        await manager.close()
+
+    asyncio.run(toggle_and_close())
+    reopened = translation_bot.GroupManager(settings_path)
+    assert not reopened.is_enabled(-1)
+    assert reopened.is_enabled(-2)
+
+
+def test_failed_write_is_retried_without_undoing_newer_toggles(settings_path, monkeypatch):
+    manager = translation_bot.GroupManager(settings_path)
+    write = translation_bot.GroupManager.write
+
+    def fail(self, rows):
+        raise translation_bot.sqlite3.OperationalError('database is locked')
+
+    async def flush_twice():
+        manager.toggle(-1)
+        manager.toggle(-2)
+        monkeypatch.setattr(translation_bot.GroupManager, 'write', fail)
+        await manager.flush()
+        assert manager.pending == {-1: False, -2: False}
+
+        manager.toggle(-2)
+        monkeypatch.setattr(translation_bot.GroupManager, 'write', write)
+        await manager.flush()
+        assert not manager.pending
+        manager.db.close()
+
+    asyncio.run(flush_twice())
+    reopened = translation_bot.GroupManager(settings_path)
+    assert not reopened.is_enabled(-1)
+    assert reopened.is_enabled(-2)
+
+
+def test_close_waits_for_a_running_write(settings_path, monkeypatch):
+    manager = translation_bot.GroupManager(settings_path)
+    write = translation_bot.GroupManager.write
+    started = threading.Event()
+
+    def slow_write(self, rows):
+        started.set()
+        time.sleep(0.1)
+        write(self, rows)
+
+    monkeypatch.setattr(translation_bot.GroupManager, 'write', slow_write)
+
+    async def close_mid_write():
+        manager.start()
+        manager.toggle(-1)
+        await asyncio.to_thread(started.wait, 1)
+        await manager.close()
+
+    asyncio.run(close_mid_write())
+    reopened = translation_bot.GroupManager(settings_path)
+    assert not reopened.is_enabled(-1)
@@ -0,0 +1,35 @@
+# Cheap per-message checks that decide whether a text is worth detecting and
+# translating. Kept free of bot and network code, with full type hints, so it
+# can be compiled to a native extension with `mypyc text_filter.py`; the bot
+# imports it the same way whether compiled or not.
+import re
+
+# Common English function words that are rare as whole words in other
+# Latin-script languages. Words that are everyday words elsewhere are left out:
+# "a", "i", "in" and "on", but also "was" and "will" (German), "is" and "of"
+# (Dutch), "my" (Polish, Czech), "for" and "have" (Danish, Norwegian), "not"
+# (German), "be" (Hungarian) and "can" (Turkish).
+ENGLISH_STOPWORDS: frozenset[str] = frozenset({
+    'the', 'and', 'you', 'it', 'are', 'this', 'that', 'with', 'what',
+    'your', 'they', 'there', 'would', 'how', 'from'
+})
+WORD_RE = re.compile(r"[a-z']+")
+
+def looks_non_english_ascii(text: str) -> bool:
+    # Only letters can carry another language
+    if not any(c.isalpha() for c in text):
+        return False
+    # Two distinct English function words are a strong enough signal to skip
+    # detection entirely; anything else is left to the detector
+    words = ENGLISH_STOPWORDS.intersection(WORD_RE.findall(text.lower()))
+    return len(words) < 2
+
+def should_translate(text: str) -> bool:
+    # Only strip when there is edge whitespace to strip
+    if (text[0].isspace() or text[-1].isspace()) and len(text.strip()) < 2:
+        return False
+    # ASCII text with no letters ("+1", "10:30", ":-)") or plain English
+    # needs no detector or network call
+    if text.isascii() and not looks_non_english_ascii(text):
+        return False
+    return True
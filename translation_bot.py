@@ -1,8 +1,26 @@
 import os
+import re
+import asyncio
 import logging
+from functools import lru_cache
+import sqlite3
+import time
+from urllib.parse import quote_plus
+from collections import OrderedDict, defaultdict, deque
+import gcld3
+import httpx
+import orjson
 from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from deep_translator import GoogleTranslator
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import Application, ChatMemberHandler, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram.request import HTTPXRequest
+from text_filter import should_translate
+
+try:
+    import uvloop
+except ImportError:
+    # Not available on Windows; the default asyncio loop works everywhere
+    uvloop = None
 
 # Configure logging
 logging.basicConfig(
@@ -10,153 +28,671 @@ logging.basicConfig(
     level=logging.INFO
 )
 logger = logging.getLogger(__name__)
+# httpx logs every request URL at INFO, which would format a record (and leak
+# the message text into the logs) for every translation
+logging.getLogger('httpx').setLevel(logging.WARNING)
 
 # Bot token from environment
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 
-if not BOT_TOKEN:
-    print("ERROR: BOT_TOKEN environment variable not set!")
-    print("Please set BOT_TOKEN in Railway environment variables")
-    exit(1)
+# Telegram pushes updates to a webhook when the bot has a public URL (set
+# WEBHOOK_URL, or generate a Railway domain); otherwise it falls back to polling
+PORT = int(os.getenv('PORT', '8080'))
+# WEBHOOK_HOST is the public name of a reverse proxy (nginx/caddy) terminating TLS
+PUBLIC_HOST = os.getenv('WEBHOOK_HOST') or os.getenv('RAILWAY_PUBLIC_DOMAIN')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL') or (f"https://{PUBLIC_HOST}" if PUBLIC_HOST else None)
+
+# In-process language detector (CLD3), so English messages never touch the network
+DETECTOR = gcld3.NNetLanguageIdentifier(min_num_bytes=0, max_num_bytes=1000)
+
+# Async HTTP/2 client for Google Translate. Concurrent translations share
+# pooled keep-alive connections instead of paying a TLS handshake each.
+TRANSLATE_URL = 'https://translate.googleapis.com/translate_a/single'
+# The transport also retries failed connection attempts, which are always safe
+# to repeat since nothing has been sent yet.
+CLIENT = httpx.AsyncClient(
+    timeout=5,
+    transport=httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=2,
+        limits=httpx.Limits(max_keepalive_connections=32)
+    )
+)
+
+# Group settings storage. Translation is on by default, so only the chats that
+# turned it off are kept in memory. Changes are written behind to SQLite in
+# batches, so /toggle never waits on the disk and restarts keep each setting.
+# Point SETTINGS_DB at a mounted Railway volume to keep settings across redeploys
+SETTINGS_DB = os.getenv('SETTINGS_DB', 'settings.db')
+SETTINGS_FLUSH_INTERVAL = 1
+
+class GroupManager:
+    __slots__ = ('db', 'disabled_chats', 'pending', 'writer', 'stopping')
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS settings (chat_id INTEGER PRIMARY KEY, enabled INTEGER NOT NULL)')
+        self.disabled_chats = {row[0] for row in self.db.execute('SELECT chat_id FROM settings WHERE enabled = 0')}
+        self.pending = {}
+        self.writer = None
+        self.stopping = None
+
+    def is_enabled(self, chat_id):
+        return chat_id not in self.disabled_chats
+
+    def toggle(self, chat_id):
+        enabled = chat_id in self.disabled_chats
+        if enabled:
+            self.disabled_chats.discard(chat_id)
+        else:
+            self.disabled_chats.add(chat_id)
+        self.pending[chat_id] = enabled
+        return enabled
+
+    def write(self, rows):
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO settings (chat_id, enabled) VALUES (?, ?)', rows)
+
+    async def flush(self):
+        if not self.pending:
+            return
+        rows = list(self.pending.items())
+        self.pending.clear()
+        try:
+            await asyncio.to_thread(self.write, rows)
+        except sqlite3.Error as e:
+            logger.error("Saving group settings failed: %s", e)
+            # Retry on the next flush, unless the chat was toggled again meanwhile
+            for chat_id, enabled in rows:
+                self.pending.setdefault(chat_id, enabled)
+
+    async def run_writer(self):
+        while not self.stopping.is_set():
+            try:
+                await asyncio.wait_for(self.stopping.wait(), SETTINGS_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    # Created here rather than in __init__ so the event belongs to the running loop
+    def start(self):
+        self.stopping = asyncio.Event()
+        self.writer = asyncio.create_task(self.run_writer())
+
+    # The writer is stopped and awaited rather than cancelled, since cancelling
+    # would not stop a write already running in its thread before db.close()
+    async def close(self):
+        if self.writer is not None:
+            self.stopping.set()
+            await self.writer
+        await self.flush()
+        self.db.close()
+
+# Opened in post_init, so importing the module touches no files
+group_manager = None
+
+# Display names for reply labels; other codes are shown upper-cased
+LANG_NAMES = {
+    'bn': 'Bengali', 'hi': 'Hindi', 'ar': 'Arabic', 'es': 'Spanish',
+    'fr': 'French', 'de': 'German', 'pt': 'Portuguese', 'ru': 'Russian',
+    'ja': 'Japanese', 'ko': 'Korean', 'zh': 'Chinese', 'it': 'Italian',
+    'ur': 'Urdu', 'ta': 'Tamil', 'te': 'Telugu', 'mr': 'Marathi'
+}
+
+# Codes may carry a region or script suffix ('zh-CN', 'hi-Latn')
+@lru_cache(maxsize=256)
+def lang_name(code):
+    base = code.split('-')[0]
+    return LANG_NAMES.get(base, base.upper())
+
+# Static command replies
+START_TEXT = "🌐 Welcome to Translation Bot!\n\nI automatically translate non-English messages to English in groups.\n\nAdmin Commands:\n/toggle - Enable/disable translation\n/settings - Show current settings\n/help - Get help guide\n\nAdd me to your group and make me admin to start translating!"
+HELP_TEXT = "🤖 Translation Bot Help\n\nHow to use:\n1. Add me to your group\n2. Make me administrator\n3. I'll auto-translate non-English messages\n\nCommands:\n/start - Start the bot\n/toggle - Toggle translation (admin only)\n/settings - Show settings\n/help - This message"
+
+# Reply posted for each translated message
+REPLY_TEMPLATE = "🌐 {lang}: {translated}"
+# A line in a batched reply, named after its sender so the group can tell which
+# message it translates
+BATCH_LINE_TEMPLATE = "👤 {sender}\n{text}"
+
+# Replies for /settings and /toggle, indexed by whether translation is enabled
+SETTINGS_REPLIES = tuple(
+    f"⚙️ Translation Settings\n\nStatus: {status}\nTarget Language: English\nSupported Languages: 100+\n\nUse /toggle to enable/disable"
+    for status in ("DISABLED", "ENABLED")
+)
+TOGGLE_REPLIES = tuple(
+    f"🔄 Translation is now {status} for this group!"
+    for status in ("DISABLED", "ENABLED")
+)
+
+GROUP_CHAT_TYPES = frozenset({'group', 'supergroup'})
+ADMIN_STATUSES = frozenset({'administrator', 'creator'})
+
+# Admin lookups are cached so repeated /toggle calls skip get_chat_member. Entries
+# are dropped as soon as Telegram reports a member change, so the TTL only
+# matters for changes the bot does not hear about.
+ADMIN_CACHE_TTL = 300
+ADMIN_CACHE_SIZE = 10_000
+admin_cache = OrderedDict()
+
+async def is_admin(bot, chat_id, user_id):
+    key = (chat_id, user_id)
+    cached = admin_cache.get(key)
+    if cached is not None and time.monotonic() < cached[1]:
+        admin_cache.move_to_end(key)
+        return cached[0]
+    member = await bot.get_chat_member(chat_id, user_id)
+    admin = member.status in ADMIN_STATUSES
+    admin_cache[key] = (admin, time.monotonic() + ADMIN_CACHE_TTL)
+    admin_cache.move_to_end(key)
+    if len(admin_cache) > ADMIN_CACHE_SIZE:
+        admin_cache.popitem(last=False)
+    return admin
+
+def _normalize(text):
+    return ' '.join(text.split()).casefold()
+
+TRANSLATE_RETRIES = 1
+TRANSLATE_RETRY_DELAY = 1
+
+class TranslationError(Exception):
+    pass
+
+# Caps requests in flight to Google, so a burst across many chats queues here
+# instead of opening dozens of connections and tripping Google's rate limiting.
+# The semaphore is created in post_init, on PTB's running loop: before Python
+# 3.10 it would bind to whatever loop was current at import.
+MAX_CONCURRENT_TRANSLATIONS = 20
+translate_semaphore = None
+
+# One request returns both the translation and the detected source language
+async def fetch_translation(text):
+    params = {'client': 'gtx', 'sl': 'auto', 'tl': 'en', 'dt': 't', 'q': text}
+    async with translate_semaphore:
+        response = await CLIENT.get(TRANSLATE_URL, params=params)
+    response.raise_for_status()
+    try:
+        data = response.json()
+        translated = ''.join(part[0] for part in data[0] if part[0])
+        return data[2], translated
+    except (ValueError, LookupError, TypeError) as e:
+        raise TranslationError(f"Unexpected translate response: {e}") from e
+
+# Collects translations requested within a short window and sends them to Google
+# as one request, joined by a separator. Google reports a single source language
+# per request, so only texts the local detector put in the same language share a
+# request, and texts it was unsure about are sent on their own. If the joined
+# request fails or its reply does not split back into the right number of
+# parts, each text is translated on its own instead.
+BATCH_SEPARATOR = '\n@@SPLIT@@\n'
+BATCH_SPLIT_RE = re.compile(r'\s*@@\s*SPLIT\s*@@\s*', re.IGNORECASE)
+
+# Request size is measured percent-encoded, since that is what goes into the URL:
+# non-Latin scripts take up to nine bytes per character there
+def encoded_length(text):
+    return len(quote_plus(text))
+
+SEPARATOR_LENGTH = encoded_length(BATCH_SEPARATOR)
+
+class TranslationBatcher:
+    __slots__ = ('window', 'max_items', 'max_encoded', 'pending', 'flush_task')
+
+    # max_encoded is about what a single 500-character message in Bengali or
+    # Hindi already sends, so a batch never makes a longer URL than one message
+    def __init__(self, window=0.04, max_items=50, max_encoded=4500):
+        self.window = window
+        self.max_items = max_items
+        self.max_encoded = max_encoded
+        self.pending = []
+        self.flush_task = None
+
+    def submit(self, text, hint):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((text, hint, future))
+        if self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush())
+        return future
+
+    async def flush(self):
+        await asyncio.sleep(self.window)
+        items, self.pending, self.flush_task = self.pending, [], None
+
+        groups = defaultdict(list)
+        batches = []
+        for item in items:
+            if item[1] is None:
+                batches.append([item])
+            else:
+                groups[item[1]].append(item)
+
+        # Keep each request under the item cap and a URL-safe length
+        for group in groups.values():
+            batch, size = [], 0
+            for item in group:
+                length = encoded_length(item[0])
+                if batch and (len(batch) >= self.max_items or size + length > self.max_encoded):
+                    batches.append(batch)
+                    batch, size = [], 0
+                batch.append(item)
+                size += length + SEPARATOR_LENGTH
+            batches.append(batch)
+        await asyncio.gather(*(self.translate_batch(batch) for batch in batches))
+
+    async def translate_batch(self, batch):
+        if len(batch) == 1:
+            results = await self.fetch_each(batch)
+        else:
+            results = await self.fetch_joined(batch)
+
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    # Results hold an exception in place of each text that failed
+    async def fetch_each(self, batch):
+        return await asyncio.gather(
+            *(fetch_translation(text) for text, _, _ in batch),
+            return_exceptions=True
+        )
+
+    async def fetch_joined(self, batch):
+        try:
+            _, joined = await fetch_translation(BATCH_SEPARATOR.join(text for text, _, _ in batch))
+        except (httpx.HTTPStatusError, TranslationError) as e:
+            logger.warning("Batch of %s failed (%s), translating one by one", len(batch), e)
+            return await self.fetch_each(batch)
+
+        parts = BATCH_SPLIT_RE.split(joined.strip())
+        if len(parts) == len(batch):
+            return [(hint, part.strip()) for (_, hint, _), part in zip(batch, parts)]
+
+        logger.warning("Batch of %s split into %s parts, translating one by one", len(batch), len(parts))
+        return await self.fetch_each(batch)
+
+translation_batcher = TranslationBatcher()
+
+# Repeated phrases are answered from memory. Entries map a cache key (the
+# stripped, casefolded text) to (source_lang, translated), with translated set
+# to None when there is nothing to show, so English verdicts are cached too.
+# Entries expire after an hour so improved translations eventually show up.
+# Failures raise, so they are never cached. Everything runs on the event loop
+# thread, so no lock is needed.
+TRANSLATION_CACHE_SIZE = 10_000
+TRANSLATION_CACHE_TTL = 3600
+_translation_cache = OrderedDict()
+
+def cache_key(text):
+    return text.strip().casefold()
+
+def get_cached_translation(key):
+    cached = _translation_cache.get(key)
+    if cached is None:
+        return None
+    result, expires_at = cached
+    if time.monotonic() >= expires_at:
+        del _translation_cache[key]
+        return None
+    _translation_cache.move_to_end(key)
+    return result
+
+def cache_translation(key, result):
+    _translation_cache[key] = (result, time.monotonic() + TRANSLATION_CACHE_TTL)
+    _translation_cache.move_to_end(key)
+    if len(_translation_cache) > TRANSLATION_CACHE_SIZE:
+        _translation_cache.popitem(last=False)
+
+# Translations currently being fetched, so identical messages arriving at the
+# same time (forwards, copy-paste) wait on one request instead of each sending one
+_inflight = {}
+
+async def _translate_and_cache(key, text, hint):
+    source, translated = await translation_batcher.submit(text, hint)
+    if source == 'en' or not translated or _normalize(translated) == _normalize(text):
+        translated = None
+
+    result = (source, translated)
+    cache_translation(key, result)
+    return result
 
-# Group settings storage
-group_settings = {}
+async def translate_cached(key, text, hint=None):
+    cached = get_cached_translation(key)
+    if cached is not None:
+        return cached
+
+    task = _inflight.get(key)
+    if task is None:
+        task = _inflight[key] = asyncio.ensure_future(_translate_and_cache(key, text, hint))
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # Shielded so one cancelled caller does not cancel the request for the others
+    return await asyncio.shield(task)
+
+# Parses Telegram's responses (getUpdates above all) with orjson instead of the
+# stdlib json module. Outgoing parameters are form fields that PTB already sends
+# as plain strings, so only decoding is on the hot path.
+class OrjsonRequest(HTTPXRequest):
+    @staticmethod
+    def parse_json_payload(payload):
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            # Let PTB log the bad payload and raise its usual TelegramError
+            return HTTPXRequest.parse_json_payload(payload)
+
+# Outbound Bot API calls share one pool sized to match concurrent_updates, so
+# replies from concurrently running handlers never queue for a free connection.
+# getUpdates only ever has one request in flight and keeps PTB's single connection.
+# It also stays on HTTP/1.1: PTB warns that h2 mishandles cancelled keepalive
+# connections, and a long poll is the request most likely to be cancelled mid-wait.
+# Outbound calls are short and run to completion, so they keep HTTP/2.
+TELEGRAM_POOL_SIZE = 256
+
+# Sliding-window limit on sends per chat. Telegram allows about 20 messages a
+# minute in a group; waiting here is cheaper than a 429 and its retry_after.
+class RateLimiter:
+    __slots__ = ('rate', 'per', 'sent', 'next_prune')
+
+    def __init__(self, rate=20, per=60):
+        self.rate = rate
+        self.per = per
+        self.sent = {}
+        self.next_prune = 0
+
+    # Forgets chats with no send left in the window, so a bot in many groups
+    # only keeps timestamps for the chats it replied to recently
+    def prune(self, now):
+        stale = [chat_id for chat_id, sent in self.sent.items() if now - sent[-1] >= self.per]
+        for chat_id in stale:
+            del self.sent[chat_id]
+        self.next_prune = now + self.per
+
+    async def acquire(self, chat_id):
+        while True:
+            now = time.monotonic()
+            if now >= self.next_prune:
+                self.prune(now)
+            # Looked up on every pass, since a prune during the wait may have
+            # dropped this chat's entry
+            sent = self.sent.setdefault(chat_id, deque())
+            while sent and now - sent[0] >= self.per:
+                sent.popleft()
+            if len(sent) < self.rate:
+                sent.append(now)
+                return
+            await asyncio.sleep(self.per - (now - sent[0]))
+
+# Coalesces translations for the same chat that arrive within a short window
+# into a single message, so busy groups stay under Telegram's send rate limits.
+class ReplyBatcher:
+    __slots__ = ('window', 'limit', 'pending', 'limiter')
+
+    def __init__(self, window=0.5, limit=4000):
+        self.window = window
+        self.limit = limit
+        self.pending = {}
+        self.limiter = RateLimiter()
+
+    def add(self, context, chat_id, message_id, sender, text):
+        pending = self.pending.get(chat_id)
+        if pending is not None:
+            pending.append((message_id, sender, text))
+            return
+        self.pending[chat_id] = [(message_id, sender, text)]
+        context.application.create_task(self.flush(context.bot, chat_id))
+
+    async def flush(self, bot, chat_id):
+        await asyncio.sleep(self.window)
+        # The chat's list stays open until a send slot is free, so translations
+        # arriving during a rate-limit wait join this batch instead of queueing
+        # a message of their own
+        await self.limiter.acquire(chat_id)
+        items = self.pending.pop(chat_id)
+        try:
+            if len(items) == 1:
+                message_id, _, text = items[0]
+                await self.send(
+                    bot, chat_id, text,
+                    reply_to_message_id=message_id,
+                    allow_sending_without_reply=True
+                )
+                return
+
+            # Each line names its sender, and each message replies to the first
+            # message it covers
+            chunks, chunk, size = [], [], 0
+            for message_id, sender, text in items:
+                line = BATCH_LINE_TEMPLATE.format(sender=sender, text=text)
+                if chunk and size + len(line) + 2 > self.limit:
+                    chunks.append((reply_to, chunk))
+                    chunk, size = [], 0
+                if not chunk:
+                    reply_to = message_id
+                chunk.append(line)
+                size += len(line) + 2
+            chunks.append((reply_to, chunk))
+
+            for i, (reply_to, chunk) in enumerate(chunks):
+                # The first chunk uses the slot acquired above
+                if i:
+                    await self.limiter.acquire(chat_id)
+                await self.send(
+                    bot, chat_id, '\n\n'.join(chunk),
+                    reply_to_message_id=reply_to,
+                    allow_sending_without_reply=True
+                )
+        except TelegramError as e:
+            logger.error("Sending translations failed: %s", e)
+
+    async def send(self, bot, chat_id, text, **kwargs):
+        try:
+            await bot.send_message(chat_id, text, **kwargs)
+        except RetryAfter as e:
+            # Flood control: wait as long as Telegram asks, then try once more
+            await asyncio.sleep(e.retry_after)
+            await bot.send_message(chat_id, text, **kwargs)
+
+# Rejects messages that are too short, too long or look like commands inside
+# PTB's dispatcher, before a handler coroutine is even created for them
+class TranslatableText(filters.MessageFilter):
+    def filter(self, message):
+        text = message.text
+        return text is not None and 2 <= len(text) <= 500 and text[0] != '/'
+
+TRANSLATABLE_TEXT = filters.TEXT & ~filters.COMMAND & TranslatableText()
 
 class TranslationBot:
+    __slots__ = ('reply_batcher',)
+
     def __init__(self):
-        self.supported_languages = {
-            'bn': 'Bengali', 'hi': 'Hindi', 'ar': 'Arabic', 'es': 'Spanish',
-            'fr': 'French', 'de': 'German', 'pt': 'Portuguese', 'ru': 'Russian',
-            'ja': 'Japanese', 'ko': 'Korean', 'zh': 'Chinese', 'it': 'Italian',
-            'ur': 'Urdu', 'ta': 'Tamil', 'te': 'Telugu', 'mr': 'Marathi'
-        }
+        self.reply_batcher = ReplyBatcher()
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        welcome_text = "🌐 Welcome to Translation Bot!\n\nI automatically translate non-English messages to English in groups.\n\nAdmin Commands:\n/toggle - Enable/disable translation\n/settings - Show current settings\n/help - Get help guide\n\nAdd me to your group and make me admin to start translating!"
-        await update.message.reply_text(welcome_text)
+        await update.message.reply_text(START_TEXT)
 
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        help_text = "🤖 Translation Bot Help\n\nHow to use:\n1. Add me to your group\n2. Make me administrator\n3. I'll auto-translate non-English messages\n\nCommands:\n/start - Start the bot\n/toggle - Toggle translation (admin only)\n/settings - Show settings\n/help - This message"
-        await update.message.reply_text(help_text)
+        await update.message.reply_text(HELP_TEXT)
 
     async def toggle_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if update.message.chat.type not in GROUP_CHAT_TYPES:
+            await update.message.reply_text("❌ This command works only in groups!")
+            return
+
+        user = update.message.from_user
+        chat_id = update.message.chat.id
+
         try:
-            if update.message.chat.type not in ['group', 'supergroup']:
-                await update.message.reply_text("❌ This command works only in groups!")
-                return
+            admin = await is_admin(context.bot, chat_id, user.id)
+        except TelegramError as e:
+            logger.error("Permission check failed: %s", e)
+            await update.message.reply_text("❌ Error checking permissions!")
+            return
+        if not admin:
+            await update.message.reply_text("❌ Only admins can use this command!")
+            return
 
-            user = update.message.from_user
-            chat_id = update.message.chat.id
-            
-            try:
-                member = await context.bot.get_chat_member(chat_id, user.id)
-                if member.status not in ['administrator', 'creator']:
-                    await update.message.reply_text("❌ Only admins can use this command!")
-                    return
-            except Exception as e:
-                logger.error(f"Permission check failed: {e}")
-                await update.message.reply_text("❌ Error checking permissions!")
-                return
+        enabled = group_manager.toggle(chat_id)
 
-            current = group_settings.get(chat_id, True)
-            group_settings[chat_id] = not current
-            new_status = "ENABLED" if group_settings[chat_id] else "DISABLED"
-            
-            await update.message.reply_text(f"🔄 Translation is now {new_status} for this group!")
-            
-        except Exception as e:
-            logger.error(f"Toggle error: {e}")
-            await update.message.reply_text("❌ Command failed!")
+        await update.message.reply_text(TOGGLE_REPLIES[enabled])
 
     async def settings_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        try:
-            if update.message.chat.type not in ['group', 'supergroup']:
-                await update.message.reply_text("❌ This command works only in groups!")
-                return
+        if update.message.chat.type not in GROUP_CHAT_TYPES:
+            await update.message.reply_text("❌ This command works only in groups!")
+            return
 
-            chat_id = update.message.chat.id
-            status = "ENABLED" if group_settings.get(chat_id, True) else "DISABLED"
-            
-            settings_text = f"⚙️ Translation Settings\n\nStatus: {status}\nTarget Language: English\nSupported Languages: 100+\n\nUse /toggle to enable/disable"
-            await update.message.reply_text(settings_text)
-            
-        except Exception as e:
-            logger.error(f"Settings error: {e}")
-            await update.message.reply_text("❌ Command failed!")
+        chat_id = update.message.chat.id
+        await update.message.reply_text(SETTINGS_REPLIES[group_manager.is_enabled(chat_id)])
 
-    async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        try:
-            if update.message.from_user.is_bot:
-                return
+    # Single error path for every handler: log the traceback, and tell the user
+    # when one of their commands failed
+    async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE):
+        logger.error("Handler error", exc_info=context.error)
 
-            if update.message.chat.type in ['group', 'supergroup']:
-                chat_id = update.message.chat.id
-                if not group_settings.get(chat_id, True):
-                    return
+        if not isinstance(update, Update) or update.effective_message is None:
+            return
+        text = update.effective_message.text
+        if text and text.startswith('/'):
+            try:
+                await update.effective_message.reply_text("❌ Command failed!")
+            except TelegramError:
+                pass
 
-            text = update.message.text
-            if not text or len(text.strip()) < 2:
-                return
+    async def member_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        change = update.chat_member
+        admin_cache.pop((change.chat.id, change.new_chat_member.user.id), None)
 
-            if text.startswith('/'):
-                return
+    async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        message = update.message
+        if message is None:
+            return
+        user = message.from_user
+        if user is None or user.is_bot:
+            return
+
+        chat_id = message.chat.id
+        if message.chat.type in GROUP_CHAT_TYPES and not group_manager.is_enabled(chat_id):
+            return
 
-            if len(text) > 500:
+        # Length and leading '/' were checked by TRANSLATABLE_TEXT already
+        text = message.text
+        if not should_translate(text):
+            return
+
+        # A cache hit answers both "is it English?" and "what does it say?"
+        key = cache_key(text)
+        cached = get_cached_translation(key)
+        if cached is not None:
+            source, translated = cached
+        else:
+            result = DETECTOR.FindLanguage(text=text)
+            if result.language == 'en' and result.is_reliable:
+                cache_translation(key, ('en', None))
                 return
 
-            try:
-                detected = GoogleTranslator(source='auto').detect(text)
-                if detected == 'en':
+            # Timeouts are usually transient and worth another try; HTTP errors
+            # and malformed responses are not
+            hint = result.language if result.is_reliable else None
+            for attempt in range(TRANSLATE_RETRIES + 1):
+                try:
+                    source, translated = await translate_cached(key, text.strip(), hint)
+                    break
+                except httpx.TimeoutException as e:
+                    if attempt == TRANSLATE_RETRIES:
+                        logger.warning("Translation timed out: %s", e)
+                        return
+                    await asyncio.sleep(TRANSLATE_RETRY_DELAY)
+                except (httpx.HTTPError, TranslationError) as e:
+                    logger.error("Translation failed: %s", e)
                     return
-            except Exception as e:
-                logger.warning(f"Language detection failed: {e}")
-                detected = 'unknown'
 
-            try:
-                translated = GoogleTranslator(source='auto', target='en').translate(text)
-                
-                if not translated or translated == text:
-                    return
-                    
-            except Exception as e:
-                logger.error(f"Translation failed: {e}")
-                return
+        if not translated:
+            return
 
-            lang_name = self.supported_languages.get(detected, detected.upper())
-            response = f"Translation 🌐\n\n{lang_name} → English:\n{translated}\n\nOriginal: {text}"
+        label = lang_name(source) if source else "Auto-detected"
+        response = REPLY_TEMPLATE.format(lang=label, translated=translated)
 
-            await update.message.reply_text(response)
+        self.reply_batcher.add(context, chat_id, message.message_id, user.first_name, response)
 
-        except Exception as e:
-            logger.error(f"Message handling error: {e}")
+async def post_init(application: Application):
+    global translate_semaphore, group_manager
+    translate_semaphore = asyncio.Semaphore(MAX_CONCURRENT_TRANSLATIONS)
+    group_manager = GroupManager(SETTINGS_DB)
+    group_manager.start()
+
+async def post_shutdown(application: Application):
+    await group_manager.close()
+    await CLIENT.aclose()
 
 def main():
     try:
         print("Starting Translation Bot...")
         
         if not BOT_TOKEN:
-            print("ERROR: BOT_TOKEN not found!")
-            return
+            print("ERROR: BOT_TOKEN environment variable not set!")
+            print("Please set BOT_TOKEN in Railway environment variables")
+            exit(1)
+
+        if uvloop is not None:
+            uvloop.install()
 
         bot = TranslationBot()
         
-        application = Application.builder().token(BOT_TOKEN).build()
+        application = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .concurrent_updates(TELEGRAM_POOL_SIZE)
+            .request(OrjsonRequest(
+                connection_pool_size=TELEGRAM_POOL_SIZE,
+                connect_timeout=5,
+                read_timeout=20,
+                write_timeout=20,
+                http_version="2"
+            ))
+            .get_updates_request(OrjsonRequest())
+            .post_init(post_init)
+            .post_shutdown(post_shutdown)
+            .build()
+        )
 
         application.add_handler(CommandHandler("start", bot.start_command))
         application.add_handler(CommandHandler("help", bot.help_command))
         application.add_handler(CommandHandler("toggle", bot.toggle_command))
         application.add_handler(CommandHandler("settings", bot.settings_command))
+        application.add_handler(ChatMemberHandler(bot.member_update, ChatMemberHandler.CHAT_MEMBER))
         
         application.add_handler(MessageHandler(
-            filters.TEXT & ~filters.COMMAND, 
+            TRANSLATABLE_TEXT,
             bot.handle_message
         ))
+        application.add_error_handler(bot.error_handler)
 
         print("Bot is running successfully!")
-        application.run_polling(drop_pending_updates=True)
+        # Only the update types the handlers use. chat_member updates are opt-in;
+        # they keep the admin cache fresh
+        allowed_updates = [Update.MESSAGE, Update.CHAT_MEMBER]
+        if WEBHOOK_URL:
+            application.run_webhook(
+                listen='0.0.0.0',
+                port=PORT,
+                url_path=BOT_TOKEN,
+                webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{BOT_TOKEN}",
+                allowed_updates=allowed_updates,
+                drop_pending_updates=True
+            )
+        else:
+            application.run_polling(
+                timeout=20,
+                bootstrap_retries=-1,
+                allowed_updates=allowed_updates,
+                drop_pending_updates=True
+            )
         
     except Exception as e:
-        logger.error(f"Bot crashed: {e}")
+        logger.error("Bot crashed: %s", e)
         print(f"Fatal error: {e}")
 
 if __name__ == '__main__':